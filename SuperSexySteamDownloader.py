@@ -1,23 +1,37 @@
+from __future__ import annotations
+
 import os
+import io
 import time
 import ast
+import base64
 import getpass
 import re
 import concurrent.futures
+import itertools
+import mmap
 import hashlib
 import sys
-import keyring
-import requests
+import struct
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, BinaryIO, List, Dict, Any, Iterator, Optional, Set, TextIO, Tuple, Union
 
-# steam.py imports
-from steam.client import SteamClient
-from steam.client.cdn import CDNClient
-from steam.enums import EResult
-from steam.exceptions import ManifestError
 from tqdm import tqdm
 
+# steam.py (gevent/protobuf), keyring and requests are slow to import, so they are imported
+# where they are first needed. This keeps startup fast for quick tasks like an AppID lookup.
+if TYPE_CHECKING:
+    import requests
+    from steam.client import SteamClient
+    from steam.client.cdn import CDNClient
+
+# orjson is optional; it parses API responses straight from bytes and is noticeably faster.
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json  # type: ignore[no-redef]
+
 # This compatibility check is needed for type hinting tqdm in older Python versions.
 if sys.version_info < (3, 9):
     from typing import cast
@@ -29,6 +43,127 @@ else:
 KEYRING_SERVICE_NAME = "SteamDownloaderApp"
 KEYRING_USERNAME_KEY = "steam_username"
 
+# First line of text SFD files that store manifest content as base64 instead of repr(bytes).
+SFD_V2_HEADER = "SFDv2"
+# Binary SFD files start with this magic, followed by length-prefixed depot records.
+SFD_V3_MAGIC = b"SFD3"
+_SFD3_HEADER = struct.Struct('<II')   # app_id, depot_count
+_SFD3_DEPOT = struct.Struct('<IQI')   # depot_id, manifest_id, depot key length
+_SFD3_LENGTH = struct.Struct('<I')    # manifest content length
+
+# Downloaded chunks are buffered up to about this many bytes before each write to disk.
+_FLUSH_TARGET = 1024 * 1024
+# Downloads write through raw file descriptors; O_BINARY only exists (and matters) on Windows.
+# No O_APPEND: files are preallocated to full size and written from the resume offset.
+_DOWNLOAD_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+# Where supported (not on Windows), files are opened and directories made relative to one open
+# descriptor of the download directory, so its absolute path is not re-walked for every file.
+_USE_DIR_FD = os.open in os.supports_dir_fd and os.mkdir in os.supports_dir_fd
+# Files at least this large are written through a shared memory mapping once posix_fallocate has
+# reserved their blocks; the mapping needs read/write access to the descriptor.
+_MMAP_MIN_SIZE = 64 * 1024 * 1024
+# Only files at least this large are preallocated (must not exceed _MMAP_MIN_SIZE); for small
+# files the extra syscall costs more than the fragmentation it avoids.
+_PREALLOCATE_MIN_SIZE = 16 * 1024 * 1024
+_MMAP_OPEN_FLAGS = os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+# Where os.writev exists (not on Windows), whole chunks are handed to the kernel in batches of
+# up to this many chunks or bytes per call instead of being copied into a buffer first.
+_WRITEV_MAX_CHUNKS = 16
+_WRITEV_MAX_BYTES = 4 * 1024 * 1024
+# Download batches are sized to give each worker about this many of them, so small queues still
+# use the whole pool. Files at least _BATCH_MAX_FILE_SIZE bytes are always scheduled on their own.
+_BATCHES_PER_WORKER = 4
+_BATCH_MAX_FILE_SIZE = 16 * 1024 * 1024
+
+# First lines of the overwritten_files.txt log written after a download.
+_OVERWRITE_LOG_HEADER = b"# File versions from depots listed LATER in the .sfd file were kept.\n\n"
+
+# Shared read-only fallback for missing sections in product info; never mutate it.
+_EMPTY: Dict[str, Any] = {}
+
+# Pre-compiled patterns, shared by every call instead of being rebuilt each time.
+_INVALID_FN_RE = re.compile(r'[<>:"/\\|?*]')
+# Matches either an addappid(...) or a setManifestid(...) call, so each LUA line is scanned once.
+_RE_LUA = re.compile(
+    r'addappid\(\s*(?P<aid>\d+)\s*,\s*\d+\s*,\s*"(?P<key>[a-fA-F0-9]+)"\)'
+    r'|setManifestid\(\s*(?P<sid>\d+)\s*,\s*"(?P<mid>\d+)"'
+)
+
+# Pre-built ACF templates. Only a handful of values vary per app/depot, so the constant
+# key/value lines are baked in once instead of being formatted on every call.
+_ACF_APPSTATE_TEMPLATE = (
+    '"AppState"\n'
+    '{\n'
+    '\t"appid"\t\t"%s"\n'
+    '\t"Universe"\t\t"1"\n'
+    '\t"LauncherPath"\t\t""\n'
+    '\t"name"\t\t"%s"\n'
+    '\t"StateFlags"\t\t"4"\n'
+    '\t"installdir"\t\t"%s"\n'
+    '\t"LastUpdated"\t\t"0"\n'
+    '\t"SizeOnDisk"\t\t"%s"\n'
+    '\t"StagingSize"\t\t"0"\n'
+    '\t"buildid"\t\t"%s"\n'
+    '\t"LastOwner"\t\t"None"\n'
+    '\t"UpdateResult"\t\t"0"\n'
+    '\t"BytesToDownload"\t\t"0"\n'
+    '\t"BytesDownloaded"\t\t"0"\n'
+    '\t"BytesToStage"\t\t"0"\n'
+    '\t"BytesStaged"\t\t"0"\n'
+    '\t"TargetBuildID"\t\t"0"\n'
+    '\t"AutoUpdateBehavior"\t\t"0"\n'
+    '\t"AllowOtherDownloadsWhileRunning"\t\t"0"\n'
+    '\t"ScheduledAutoUpdate"\t\t"0"\n'
+    '\t"InstalledDepots"\n'
+    '\t{\n'
+)
+_ACF_DEPOT_TEMPLATE = '\t\t"%s"\n\t\t{\n\t\t\t"manifest"\t\t"%s"\n\t\t\t"size"\t\t"%s"\n'
+_ACF_DLC_TEMPLATE = '\t\t\t"dlcappid"\t\t"%s"\n'
+_ACF_SHARED_DEPOT_TEMPLATE = '\t\t"%s"\t\t"%s"\n'
+
+class _DownloadProgress:
+    """
+    A lock-free byte counter for the download pool. Each worker thread adds to its own slot and a
+    single refresher thread sums the slots into the tqdm bar, so workers never wait on tqdm's lock.
+    """
+    def __init__(self, pbar: TqdmType, interval: float = 0.1):
+        self.pbar = pbar
+        self._interval = interval
+        self._local = threading.local()
+        self._slots: List[List[int]] = []
+        self._done = threading.Event()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="ssd-progress", daemon=True)
+
+    def __enter__(self) -> _DownloadProgress:
+        self._refresher.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._done.set()
+        self._refresher.join()
+        self._sync()
+
+    def update(self, n: int) -> None:
+        """Adds `n` bytes to the calling thread's slot."""
+        slot = getattr(self._local, 'slot', None)
+        if slot is None:
+            slot = self._local.slot = [0]
+            self._slots.append(slot)
+        slot[0] += n
+
+    def write(self, message: str) -> None:
+        """Prints a message without breaking the progress bar."""
+        self.pbar.write(message)
+
+    def _sync(self) -> None:
+        self.pbar.n = sum(slot[0] for slot in self._slots)
+        self.pbar.refresh()
+
+    def _refresh_loop(self) -> None:
+        while not self._done.wait(self._interval):
+            self._sync()
+
+
 class SteamManifestGenerator:
     """
     A tool to generate modern, cleanly formatted Steam appmanifest.acf files.
@@ -40,12 +175,15 @@ class SteamManifestGenerator:
         self.app_info: Dict[str, Any] = {}
         self.depots: Dict[int, Any] = {}
         self.shared_depots: Dict[int, int] = {}
+        # Computed once by parse_app_data, alongside sorting the depot maps.
+        self._size_on_disk: int = 0
         
         # This allows the generator to use an existing, logged-in client.
         if client:
             self.client = client
             self._was_client_passed = True
         else:
+            from steam.client import SteamClient
             self.client = SteamClient()
             self._was_client_passed = False
 
@@ -55,6 +193,8 @@ class SteamManifestGenerator:
             print("Using existing Steam connection.")
             return True
 
+        from steam.enums import EResult
+
         print("Attempting to log in to Steam anonymously...")
         result = self.client.anonymous_login()
         if result != EResult.OK:
@@ -69,10 +209,10 @@ class SteamManifestGenerator:
         print(f"Fetching product info for app_id: {self.app_id}...")
         try:
             res = self.client.get_product_info(apps=[self.app_id])
-            if 'apps' not in res or self.app_id not in res['apps']:
+            app_data = res.get('apps', _EMPTY).get(self.app_id)
+            if app_data is None:
                 print(f"Error: No product info returned for app_id {self.app_id}. The app might not exist.")
-                return None
-            return res['apps'][self.app_id]
+            return app_data
         except Exception as e:
             print(f"An error occurred while fetching product info: {e}")
             return None
@@ -88,24 +228,27 @@ class SteamManifestGenerator:
             print(f"Error: App {self.app_id} seems to be invalid or has no 'common' section.")
             return False
 
-        common = app_data.get('common', {})
+        common = app_data['common']
         self.app_info['name'] = common.get('name', f'Unknown App {self.app_id}')
         
-        config = app_data.get('config', {})
-        self.app_info['installdir'] = config.get('installdir', re.sub(r'[<>:"/\\|?*]', '_', self.app_info['name']))
+        config = app_data.get('config') or _EMPTY
+        self.app_info['installdir'] = config.get('installdir', _INVALID_FN_RE.sub('_', self.app_info['name']))
 
-        depots_data = app_data.get('depots', {})
-        self.app_info['buildid'] = depots_data.get('branches', {}).get('public', {}).get('buildid', '0')
+        depots_data = app_data.get('depots') or _EMPTY
+        self.app_info['buildid'] = depots_data.get('branches', _EMPTY).get('public', _EMPTY).get('buildid', '0')
 
         for depot_id_str, depot_info in depots_data.items():
-            if not depot_id_str.isdigit(): continue
+            try:
+                depot_id = int(depot_id_str)
+            except ValueError:
+                continue
 
             if depot_info.get('sharedinstall') == '1':
-                parent_app = depot_info.get('depotfromapp', depot_id_str)
-                self.shared_depots[int(depot_id_str)] = int(parent_app)
+                parent_app = depot_info.get('depotfromapp', depot_id)
+                self.shared_depots[depot_id] = int(parent_app)
                 continue
 
-            public_manifest_data = depot_info.get('manifests', {}).get('public')
+            public_manifest_data = depot_info.get('manifests', _EMPTY).get('public')
             if not public_manifest_data or 'gid' not in public_manifest_data:
                 continue
 
@@ -115,57 +258,54 @@ class SteamManifestGenerator:
             }
             if 'dlcappid' in depot_info:
                 details['dlc_appid'] = int(depot_info['dlcappid'])
-            self.depots[int(depot_id_str)] = details
+            self.depots[depot_id] = details
+
+        # Sort once here so ACF generation can iterate the depot maps directly.
+        self.depots = dict(sorted(self.depots.items()))
+        self.shared_depots = dict(sorted(self.shared_depots.items()))
+        self._size_on_disk = sum(d['size'] for d in self.depots.values())
 
         print(f"Finished parsing. Found {len(self.depots)} installable depots and {len(self.shared_depots)} shared depots.")
         return True
 
     def generate_acf_content(self) -> str:
-        """Generates the ACF content with precise, manual formatting."""
+        """Generates the ACF content as a string."""
+        buf = io.StringIO()
+        self._write_acf_stream(buf)
+        return buf.getvalue()
+
+    def _write_acf_stream(self, fh: TextIO) -> None:
+        """Writes the ACF content to a text stream with precise, manual formatting."""
         print("Generating ACF file content...")
-        size_on_disk = sum(d['size'] for d in self.depots.values())
-        
-        t1, t2, t3 = "\t", "\t\t", "\t\t\t"
-        content_parts = ['"AppState"\n', '{\n']
-        main_kv = {
-            "appid": self.app_id, "Universe": 1, "LauncherPath": "", "name": self.app_info['name'],
-            "StateFlags": 4, "installdir": self.app_info['installdir'], "LastUpdated": 0,
-            "SizeOnDisk": size_on_disk, "StagingSize": 0, "buildid": self.app_info['buildid'],
-            "LastOwner": "None", "UpdateResult": 0, "BytesToDownload": 0, "BytesDownloaded": 0,
-            "BytesToStage": 0, "BytesStaged": 0, "TargetBuildID": 0, "AutoUpdateBehavior": 0,
-            "AllowOtherDownloadsWhileRunning": 0, "ScheduledAutoUpdate": 0
-        }
-        for key, value in main_kv.items():
-            content_parts.append(f'{t1}"{key}"{t2}"{value}"\n')
-
-        content_parts.extend([f'{t1}"InstalledDepots"\n', f'{t1}{{\n'])
-        for depot_id, details in sorted(self.depots.items()):
-            content_parts.extend([
-                f'{t2}"{depot_id}"\n', f'{t2}{{\n', f'{t3}"manifest"{t2}"{details["manifest"]}"\n',
-                f'{t3}"size"{t2}"{details["size"]}"\n'
-            ])
+        w = fh.write
+        w(_ACF_APPSTATE_TEMPLATE % (
+            self.app_id, self.app_info['name'], self.app_info['installdir'],
+            self._size_on_disk, self.app_info['buildid']
+        ))
+        for depot_id, details in self.depots.items():
+            w(_ACF_DEPOT_TEMPLATE % (depot_id, details['manifest'], details['size']))
             if 'dlc_appid' in details:
-                content_parts.append(f'{t3}"dlcappid"{t2}"{details["dlc_appid"]}"\n')
-            content_parts.append(f'{t2}}}\n')
-        content_parts.append(f'{t1}}}\n')
+                w(_ACF_DLC_TEMPLATE % details['dlc_appid'])
+            w('\t\t}\n')
+        w('\t}\n')
 
-        content_parts.extend([f'{t1}"SharedDepots"\n', f'{t1}{{\n'])
-        for depot_id, parent_id in sorted(self.shared_depots.items()):
-            content_parts.append(f'{t2}"{depot_id}"{t2}"{parent_id}"\n')
-        content_parts.append(f'{t1}}}\n')
+        w('\t"SharedDepots"\n\t{\n')
+        for depot_id, parent_id in self.shared_depots.items():
+            w(_ACF_SHARED_DEPOT_TEMPLATE % (depot_id, parent_id))
+        w('\t}\n')
 
-        content_parts.append('}\n')
-        return "".join(content_parts)
+        w('}\n')
 
-    def write_acf_file(self, content: str) -> None:
-        """Writes the generated content to the final .acf file."""
+    def write_acf_file(self) -> None:
+        """Streams the generated content to the final .acf file."""
         output_path = Path(self.output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
         file_path = output_path / f"appmanifest_{self.app_id}.acf"
         
         try:
-            file_path.write_text(content, encoding="utf-8")
+            with file_path.open('w', encoding="utf-8", buffering=1 << 20) as fh:
+                self._write_acf_stream(fh)
             print("-" * 50)
             print("Successfully generated manifest file!")
             print(f"Location: {file_path.resolve()}")
@@ -177,8 +317,7 @@ class SteamManifestGenerator:
         """Orchestrates the entire generation process."""
         if self.connect_to_steam():
             if self.parse_app_data():
-                acf_content = self.generate_acf_content()
-                self.write_acf_file(acf_content)
+                self.write_acf_file()
 
         # Only log out if this instance created its own client
         if not self._was_client_passed:
@@ -189,55 +328,104 @@ class SteamManifestGenerator:
 class SteamDownloaderApp:
     """A console application for downloading Steam game files using custom data files."""
 
-    def __init__(self) -> None:
-        """Initializes the application's state and clients."""
-        self.client: SteamClient = SteamClient()
-        self.cdn: CDNClient = CDNClient(self.client)
+    def __init__(self, max_workers: int = 10) -> None:
+        """
+        Initializes the application's state. The Steam clients are created on first use.
+        `max_workers` determines how many files are downloaded simultaneously.
+        """
+        self._client: Optional[SteamClient] = None
+        self._cdn: Optional[CDNClient] = None
         self.sfd_path: Optional[Path] = None
         self.lua_path: Optional[Path] = None
         self.app_id: Optional[int] = None
         self.depots_to_download: List[Dict[str, Any]] = []
-        self.overwrite_log: List[str] = []
-        # This determines how many files are downloaded simultaneously.
-        self.max_workers: int = 10
+        # The overwrite log being written during a download; entries go straight to disk.
+        self._overwrite_log_fh: Optional[BinaryIO] = None
+        # One long-lived pool serves every workflow, so threads are not recreated on each run.
+        # Its size is fixed here; max_workers is read-only so batching always matches it.
+        self._max_workers = max_workers
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssd-worker")
+        # Small files are handed to the download pool in batches of at most this size, grouped by depot.
+        self.download_batch_size: int = 64
+        # Bytes buffered per file before writing; aligned to the download filesystem's block size.
+        self._flush_threshold: int = _FLUSH_TARGET
+        # Each download thread keeps one preallocated flush buffer and reuses it for every file.
+        self._io_buffers = threading.local()
+        # Directories (relative to the download folder) already created this run, so each is made once.
+        self._dirs_made: Set[str] = set()
+        self._dirs_lock = threading.Lock()
+        # When set (--paranoid), every file is re-verified on each pass, not just the repaired ones.
+        self.paranoid: bool = False
         # This cache avoids looking up the same AppID multiple times per session.
         self.app_name_cache: Dict[int, str] = {}
+        # The rendered main menu, keyed by the state it displays.
+        self._menu_cache: Optional[Tuple[Tuple[Any, ...], str]] = None
+        # A single HTTP session is kept for the whole run so repeat lookups reuse the connection.
+        self._http: Optional[requests.Session] = None
 
     def _clear_screen(self) -> None:
         os.system('cls' if os.name == 'nt' else 'clear')
 
+    @property
+    def max_workers(self) -> int:
+        """How many files are downloaded simultaneously (the size of the shared pool)."""
+        return self._max_workers
+
+    @property
+    def client(self) -> SteamClient:
+        """The Steam client, created (and steam.py imported) on first use."""
+        if self._client is None:
+            from steam.client import SteamClient
+            self._client = SteamClient()
+        return self._client
+
+    @property
+    def cdn(self) -> CDNClient:
+        """The CDN client, created on first use."""
+        if self._cdn is None:
+            from steam.client.cdn import CDNClient
+            self._cdn = CDNClient(self.client)
+        return self._cdn
+
     def _reset_queue(self) -> None:
         """Resets the application state to prepare for a new download queue."""
         self.app_id = None
         self.depots_to_download = []
-        self.overwrite_log = []
         # Clear cached data in the CDN client to prevent state from a previous .sfd file
         # from "leaking" into the new session.
-        self.cdn.manifests.clear()
-        self.cdn.depot_keys.clear()
+        if self._cdn is not None:
+            self._cdn.manifests.clear()
+            self._cdn.depot_keys.clear()
         print("Download queue has been cleared.")
 
     def _sanitize_filename(self, name: str) -> str:
         """Removes characters from a string that are invalid in folder/file names."""
-        return re.sub(r'[<>:"/\\|?*]', '_', name)
+        return _INVALID_FN_RE.sub('_', name)
 
     def _get_game_name(self, app_id: int) -> str:
         """Fetches a game's name from its AppID, using a cache for performance."""
-        if app_id in self.app_name_cache:
-            return self.app_name_cache[app_id]
-        if not self._ensure_logged_in():
-            print("Cannot fetch game name without login.")
-            return str(app_id)
+        return self._get_game_names([app_id])[app_id]
 
-        print(f"Fetching product info for AppID {app_id}...")
-        try:
-            resp = self.client.get_product_info([app_id])
-            game_name: str = resp['apps'][app_id]['common']['name']
-            self.app_name_cache[app_id] = game_name
-            return game_name
-        except (KeyError, Exception) as e:
-            print(f"Could not fetch game name. Using AppID as fallback. Error: {e}")
-            return str(app_id)
+    def _get_game_names(self, app_ids: List[int]) -> Dict[int, str]:
+        """Fetches names for several AppIDs with a single product info request, using the cache."""
+        uncached = [app_id for app_id in dict.fromkeys(app_ids) if app_id not in self.app_name_cache]
+        if uncached:
+            if not self._ensure_logged_in():
+                print("Cannot fetch game name without login.")
+            else:
+                print(f"Fetching product info for AppID(s) {', '.join(map(str, uncached))}...")
+                try:
+                    resp = self.client.get_product_info(apps=uncached)
+                    for app_id, app_data in resp.get('apps', {}).items():
+                        if 'name' in app_data.get('common', {}):
+                            self.app_name_cache[app_id] = app_data['common']['name']
+                except Exception as e:
+                    print(f"Could not fetch game name. Using AppID as fallback. Error: {e}")
+                else:
+                    missing = [app_id for app_id in uncached if app_id not in self.app_name_cache]
+                    if missing:
+                        print(f"Could not fetch game name for AppID(s) {', '.join(map(str, missing))}. Using AppID as fallback.")
+        return {app_id: self.app_name_cache.get(app_id, str(app_id)) for app_id in app_ids}
 
     def _ensure_logged_in(self) -> bool:
         """Checks for login, attempts anonymous if needed. Returns True on success."""
@@ -257,44 +445,61 @@ class SteamDownloaderApp:
             return False
 
     def _write_sfd_file(self, filename: Path, app_id: int, collected_depots: List[Dict[str, Any]]) -> None:
-        """A centralized helper to write collected depot data to an .sfd file."""
-        with filename.open('w', errors='ignore') as f:
-            f.write(f'{app_id}\n')
-            for depot in collected_depots:
-                f.write(f"{depot['depot_id']}\n")
-                f.write(f"{depot['manifest_id']}\n")
-                f.write(f"{depot['depot_key'].hex()}\n")
-                f.write(f"{repr(depot['manifest_content'])}\n")
-            f.write("EndOfFile\n")
+        """A centralized helper to write collected depot data to a binary (SFDv3) .sfd file."""
+        # The whole file is assembled in memory and handed to the OS in a single write.
+        payload = bytearray(SFD_V3_MAGIC)
+        payload += _SFD3_HEADER.pack(app_id, len(collected_depots))
+        for depot in collected_depots:
+            payload += _SFD3_DEPOT.pack(depot['depot_id'], depot['manifest_id'], len(depot['depot_key']))
+            payload += depot['depot_key']
+            payload += _SFD3_LENGTH.pack(len(depot['manifest_content']))
+            payload += depot['manifest_content']
+        with filename.open('wb', buffering=1024 * 1024) as f:
+            f.write(payload)
         print(f"\nSuccessfully created {filename.name}.")
     
+    def _get_http(self) -> requests.Session:
+        """Returns the shared HTTP session, creating it on first use."""
+        if self._http is None:
+            import requests
+            import requests.adapters
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=10)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'User-Agent': 'SuperSexySteamDownloader', 'Accept-Encoding': 'gzip'})
+            self._http = session
+        return self._http
+
     def app_id_lookup_tool(self) -> None:
         """A utility to search the Steam store for a game name and list corresponding AppIDs."""
+        import requests
+
         search_term = input("Enter a game name to search for: ")
         if not search_term: return
         print(f"Searching for '{search_term}'...")
         try:
-            # Use a Session object to persist cookies.
-            with requests.Session() as s:
-                s.get("https://store.steampowered.com")
-                api_url = "https://store.steampowered.com/api/storesearch/"
-                params = {'term': search_term, 'l': 'english', 'cc': 'US', 'count': 20}
-                response = s.get(api_url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                if not data.get('items'):
-                    print("No results found."); return
-                print("\n--- Search Results ---")
-                for i, item in enumerate(data['items']):
-                    app_id = item.get('id', 'N/A')
-                    name = item.get('name', 'Unknown')
-                    print(f"  {i+1}. {name} (AppID: {app_id})")
-                print("----------------------")
+            api_url = "https://store.steampowered.com/api/storesearch/"
+            params = {'term': search_term, 'l': 'english', 'cc': 'US', 'count': 20}
+            response = self._get_http().get(api_url, params=params)
+            response.raise_for_status()
+            data = _json.loads(response.content)
+            if not data.get('items'):
+                print("No results found."); return
+            print("\n--- Search Results ---")
+            for i, item in enumerate(data['items']):
+                app_id = item.get('id', 'N/A')
+                name = item.get('name', 'Unknown')
+                print(f"  {i+1}. {name} (AppID: {app_id})")
+            print("----------------------")
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while searching: {e}")
 
     def login(self) -> None:
         """Handles the manual login process, with optional Keyring integration."""
+        import keyring
+
         try:
             anon_choice = input("Anonymous Login? (Y/N): ").upper()
             if anon_choice == 'N':
@@ -325,6 +530,21 @@ class SteamDownloaderApp:
         
         input("Press Enter to continue...")
         
+    def _scan(self, dir_str: str, ext: str, out: List[str]) -> None:
+        """Collects paths of files ending in `ext` under `dir_str`, skipping hidden directories."""
+        stack = [dir_str]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name[0] != '.':
+                                stack.append(entry.path)
+                        elif entry.name.endswith(ext):
+                            out.append(entry.path)
+            except OSError:
+                continue
+
     def _select_file_from_list(self, extension: str) -> Optional[Path]:
         """A generic helper to find files and return the user's selection as a Path object."""
         # This logic is crucial for PyInstaller compatibility.
@@ -337,7 +557,10 @@ class SteamDownloaderApp:
             base_dir = Path(__file__).parent
 
         print(f"Searching for {extension} files in and around: {base_dir.resolve()}")
-        found_files = sorted(list(base_dir.rglob(f"*{extension}")))
+        base_str = os.fspath(base_dir)
+        found_files: List[str] = []
+        self._scan(base_str, extension, found_files)
+        found_files.sort()
 
         if not found_files:
             print(f"No {extension} files found."); return None
@@ -345,46 +568,82 @@ class SteamDownloaderApp:
         print(f"Found {extension} files:")
         for i, f in enumerate(found_files):
             # To make the output cleaner, show the path relative to the search directory.
-            try:
-                relative_path = f.relative_to(base_dir)
-                print(f"  {i+1}. {relative_path}")
-            except ValueError:
-                print(f"  {i+1}. {f}")
+            print(f"  {i+1}. {os.path.relpath(f, base_str)}")
 
         try:
             choice = int(input(f"Select a {extension} file (number), or 0 to cancel: "))
             if 1 <= choice <= len(found_files):
-                return found_files[choice - 1]
+                return Path(found_files[choice - 1])
             elif choice != 0:
                 print("Invalid selection.")
         except ValueError:
             print("Invalid input.")
         return None
         
+    def _parse_sfd_binary(self, data: bytes) -> Tuple[int, List[Dict[str, Any]]]:
+        """Parses a binary SFDv3 file into its AppID and depot list."""
+        view = memoryview(data)
+        app_id, depot_count = _SFD3_HEADER.unpack_from(view, len(SFD_V3_MAGIC))
+        offset = len(SFD_V3_MAGIC) + _SFD3_HEADER.size
+        depots: List[Dict[str, Any]] = []
+        for _ in range(depot_count):
+            try:
+                depot_id, manifest_id, key_len = _SFD3_DEPOT.unpack_from(view, offset)
+                offset += _SFD3_DEPOT.size
+                depot_key = bytes(view[offset:offset + key_len])
+                offset += key_len
+                (content_len,) = _SFD3_LENGTH.unpack_from(view, offset)
+                offset += _SFD3_LENGTH.size
+                manifest_content = bytes(view[offset:offset + content_len])
+                offset += content_len
+            except struct.error:
+                offset = len(view) + 1
+            if offset > len(view):
+                print("\nWarning: .sfd file is incomplete."); break
+            depots.append({'depot_id': depot_id, 'manifest_id': manifest_id, 'depot_key': depot_key, 'manifest_content': manifest_content})
+        return app_id, depots
+
+    def _parse_sfd_text(self, text: str) -> Tuple[int, List[Dict[str, Any]]]:
+        """Parses a text (SFDv2 or legacy repr) file into its AppID and depot list."""
+        # Each depot is a fixed 4-line block after the AppID.
+        lines = text.splitlines()
+        # SFDv2 files carry a header line and base64 manifests; older files use repr(bytes).
+        header_lines = 1 if lines[0].strip() == SFD_V2_HEADER else 0
+        decode_manifest = base64.b64decode if header_lines else ast.literal_eval
+        app_id = int(lines[header_lines].strip())
+        depots: List[Dict[str, Any]] = []
+        for i in range(header_lines + 1, len(lines), 4):
+            if lines[i].strip() == "EndOfFile": break
+            block = lines[i:i + 4]
+            if len(block) < 4:
+                print("\nWarning: .sfd file is incomplete."); break
+            line1, line2, line3, line4 = block
+
+            depot_id = int(line1.strip())
+            manifest_id = int(line2.strip())
+            depot_key = bytes.fromhex(line3.strip())
+            manifest_content = decode_manifest(line4.strip())
+            depots.append({'depot_id': depot_id, 'manifest_id': manifest_id, 'depot_key': depot_key, 'manifest_content': manifest_content})
+        return app_id, depots
+
     def _load_sfd_from_path(self, sfd_path: Path) -> None:
         """The core engine for parsing an SFD file and populating the download queue."""
         self._reset_queue()
         print(f"Loading data from {sfd_path.name}...")
         try:
-            with sfd_path.open('r', errors='ignore') as f:
-                self.app_id = int(f.readline().strip())
-                while True:
-                    line1 = f.readline()
-                    if not line1 or line1.strip() == "EndOfFile": break
-                    line2, line3, line4 = f.readline(), f.readline(), f.readline()
-                    if not (line2 and line3 and line4):
-                        print("\nWarning: .sfd file is incomplete."); break
-                    
-                    depot_id = int(line1.strip())
-                    manifest_id = int(line2.strip())
-                    depot_key = bytes.fromhex(line3.strip())
-                    manifest_content = ast.literal_eval(line4.strip())
-
-                    depot_info = {'depot_id': depot_id, 'manifest_id': manifest_id, 'depot_key': depot_key, 'manifest_content': manifest_content}
-                    self.depots_to_download.append(depot_info)
-                    
-                    self.cdn.depot_keys[depot_id] = depot_info['depot_key']
-                    self.cdn.manifests[(self.app_id, depot_id, manifest_id)] = self.cdn.DepotManifestClass(self.cdn, self.app_id, depot_info['manifest_content'])
+            # The whole file is read in one go; the format is sniffed from its first bytes.
+            data = sfd_path.read_bytes()
+            if data[:len(SFD_V3_MAGIC)] == SFD_V3_MAGIC:
+                self.app_id, depots = self._parse_sfd_binary(data)
+            else:
+                self.app_id, depots = self._parse_sfd_text(data.decode(errors='ignore'))
+
+            for depot_info in depots:
+                depot_id, manifest_id = depot_info['depot_id'], depot_info['manifest_id']
+                self.depots_to_download.append(depot_info)
+
+                self.cdn.depot_keys[depot_id] = depot_info['depot_key']
+                self.cdn.manifests[(self.app_id, depot_id, manifest_id)] = self.cdn.DepotManifestClass(self.cdn, self.app_id, depot_info['manifest_content'])
         except Exception as e:
             print(f"A critical error occurred while loading: {e}"); self._reset_queue()
         
@@ -415,43 +674,42 @@ class SteamDownloaderApp:
         
         parsed_depots: Dict[int, Dict[str, str]] = {}
         try:
-            with self.lua_path.open('r') as f:
-                re_addappid = re.compile(r'addappid\(\s*(\d+)\s*,\s*\d+\s*,\s*"([a-fA-F0-9]+)"\)')
-                re_setmanifest = re.compile(r'setManifestid\(\s*(\d+)\s*,\s*"(\d+)"')
-                for line in f:
-                    match_add = re_addappid.search(line)
-                    if match_add:
-                        depot_id, depot_key = match_add.groups()
-                        parsed_depots[int(depot_id)] = {'key': depot_key}
-                        continue
-                    match_set = re_setmanifest.search(line)
-                    if match_set:
-                        depot_id, manifest_id = match_set.groups()
-                        if int(depot_id) in parsed_depots: parsed_depots[int(depot_id)]['manifest_id'] = manifest_id
+            for line in self.lua_path.read_text().splitlines():
+                m = _RE_LUA.search(line)
+                if not m: continue
+                if m.group('aid'):
+                    parsed_depots[int(m.group('aid'))] = {'key': m.group('key')}
+                else:
+                    depot_id = int(m.group('sid'))
+                    if depot_id in parsed_depots: parsed_depots[depot_id]['manifest_id'] = m.group('mid')
         except Exception as e: print(f"Error parsing .lua file: {e}"); return
         
         if not parsed_depots: print("No valid depots were parsed."); return
         print(f"Found {len(parsed_depots)} depots. Searching for .manifest files...")
         
         lua_dir = self.lua_path.parent
-        collected_depots = []
+        jobs = []
         for depot_id, data in parsed_depots.items():
             if 'manifest_id' not in data: continue
             
             manifest_path = lua_dir / f"{depot_id}_{data['manifest_id']}.manifest"
-            if manifest_path.exists():
-                try:
-                    manifest_content = manifest_path.read_bytes()
-                    depot_data = {
-                        'depot_id': depot_id,
-                        'manifest_id': int(data['manifest_id']),
-                        'depot_key': bytes.fromhex(data['key']),
-                        'manifest_content': manifest_content
-                    }
-                    collected_depots.append(depot_data)
-                    print(f"  -> Processed Depot {depot_id}")
-                except Exception as e: print(f"  -> Error reading manifest for Depot {depot_id}: {e}")
+            if os.path.exists(str(manifest_path)): jobs.append((depot_id, data, manifest_path))
             else: print(f"  -> Warning: Manifest file not found: {manifest_path.name}")
+
+        # Manifest files are read concurrently, then collected in their original order.
+        collected_depots = []
+        futures = [self._pool.submit(manifest_path.read_bytes) for _, _, manifest_path in jobs]
+        for (depot_id, data, _), future in zip(jobs, futures):
+            try:
+                depot_data = {
+                    'depot_id': depot_id,
+                    'manifest_id': int(data['manifest_id']),
+                    'depot_key': bytes.fromhex(data['key']),
+                    'manifest_content': future.result()
+                }
+                collected_depots.append(depot_data)
+                print(f"  -> Processed Depot {depot_id}")
+            except Exception as e: print(f"  -> Error reading manifest for Depot {depot_id}: {e}")
         
         if not collected_depots: print("Conversion failed."); return
         sfd_filename = Path(f"{self._sanitize_filename(game_name)}_converted.sfd")
@@ -525,23 +783,26 @@ class SteamDownloaderApp:
         
         self._run_manifest_generator(app_id, output_dir)
         
-    def _verify_and_repair_file(self, file_info: Any, safe_path: Path) -> bool:
+    def _verify_and_repair_file(self, file_info: Any, safe_path: str) -> bool:
         """Verifies a local file against its manifest chunks. Truncates corruption."""
-        if not safe_path.exists():
+        if not os.path.exists(safe_path):
             file_info.seek(0); return False
         try:
-            with safe_path.open('rb') as f:
+            # One buffer sized for the largest chunk is reused for every read of this file.
+            buf = bytearray(max((chunk.cb_original for chunk in file_info.chunks), default=0))
+            mv = memoryview(buf)
+            with open(safe_path, 'rb') as f:
                 verified_offset = 0
                 for chunk in file_info.chunks:
-                    data = f.read(chunk.cb_original)
-                    if not data: break
-                    if hashlib.sha1(data).digest() != chunk.sha: break
+                    n = f.readinto(mv[:chunk.cb_original])
+                    if n != chunk.cb_original: break
+                    if hashlib.sha1(mv[:n]).digest() != chunk.sha: break
                     verified_offset += chunk.cb_original
             if verified_offset == file_info.size:
                 return True
             else:
                 # Truncate the file to the last known-good byte to enable a safe resume.
-                with safe_path.open('r+b') as f: f.truncate(verified_offset)
+                with open(safe_path, 'r+b') as f: f.truncate(verified_offset)
                 file_info.seek(verified_offset); return False
         except IOError:
             file_info.seek(0); return False
@@ -551,21 +812,38 @@ class SteamDownloaderApp:
         Runs the core verification and download loop.
         Returns True on success, False if the user cancels.
         """
+        # Per-file paths are built by plain string concatenation; a Path per file is measurably
+        # slower on games with tens of thousands of files.
+        base_str = os.fspath(base_dir) + os.sep
+        self._flush_threshold = self._get_flush_threshold(base_str)
+        self._dirs_made.clear()
+        # Files that already passed verification are skipped on later passes.
+        verified_set: Set[str] = set()
+        # Set once PHASE 2 has run, so verify-only runs that wrote nothing skip the final disk flush.
+        downloaded = False
+
         # This is the main repair/download loop. It will continue until verification passes.
         while True:
             print("\nPHASE 1: Verifying local file integrity...")
             files_to_download = []
             total_download_size = 0
             
-            for file_info in tqdm(all_files, desc="Verifying files"):
-                if file_info.is_directory: continue
-                safe_path = base_dir / file_info.filename
-                
-                if not self._verify_and_repair_file(file_info, safe_path):
+            # Hashing is done by hashlib with the GIL released, so files are verified in parallel.
+            futures = {
+                self._pool.submit(self._verify_and_repair_file, file_info, base_str + file_info.filename): file_info
+                for file_info in all_files
+                if not file_info.is_directory and file_info.filename not in verified_set
+            }
+            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Verifying files"):
+                file_info = futures[future]
+                if future.result():
+                    if not self.paranoid: verified_set.add(file_info.filename)
+                else:
                     files_to_download.append(file_info)
                     total_download_size += (file_info.size - file_info.offset)
 
             if not files_to_download:
+                if downloaded: self._sync_download_dir(base_dir)
                 return True # Success! All files are present and correct.
             
             if verify_only:
@@ -577,13 +855,22 @@ class SteamDownloaderApp:
             print(f"\nPHASE 2: Downloading {len(files_to_download)} files ({total_download_size/1024/1024:.2f} MB)...")
             input("Press Enter to start...")
 
-            with tqdm(total=total_download_size, unit='B', unit_scale=True, desc="Downloading") as pbar:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                    futures = [executor.submit(self._download_single_file, f, base_dir, pbar) for f in files_to_download]
+            base_dirfd = os.open(base_str, os.O_RDONLY | os.O_DIRECTORY) if _USE_DIR_FD else None
+            try:
+                with tqdm(total=total_download_size, unit='B', unit_scale=True, desc="Downloading") as pbar, _DownloadProgress(pbar) as progress:
+                    futures = [self._pool.submit(self._download_file_batch, batch, base_str, base_dirfd, progress) for batch in self._batch_files_by_depot(files_to_download)]
                     concurrent.futures.wait(futures)
+            finally:
+                if base_dirfd is not None: os.close(base_dirfd)
+            downloaded = True
 
             print("\nPHASE 3: Running final verification...")
 
+    def _decrypt_file_list(self, manifest: Any, depot_key: bytes) -> List[Any]:
+        """Decrypts a depot manifest's filenames and returns its file list."""
+        manifest.decrypt_filenames(depot_key)
+        return list(manifest.iter_files())
+
     def download_game(self, verification_only: bool = False) -> None:
         """Prepares for and initiates the download/verification process."""
         if not self.depots_to_download or not self.app_id:
@@ -591,76 +878,291 @@ class SteamDownloaderApp:
         if not self._ensure_logged_in(): return
         
         game_name = self._get_game_name(self.app_id)
+        base_download_dir = Path(self._sanitize_filename(game_name)).resolve()
+        final_log_path = base_download_dir / 'overwritten_files.txt'
+        temp_log_path = final_log_path.with_suffix('.tmp')
         
-        self.overwrite_log = []
         master_file_map: Dict[str, Any] = {}
         print(f"\nAggregating files for '{game_name}'...")
+        jobs = []
+        # A queue can list the same manifest twice; the CDN client then returns one shared object,
+        # which must only be decrypted once, so repeats reuse the first future.
+        decrypt_futures: Dict[int, concurrent.futures.Future] = {}
         for depot in self.depots_to_download:
+            # Manifests are fetched here, not in the pool: they normally come from the loaded .sfd,
+            # and a cache miss goes through the gevent-based SteamClient, which worker threads cannot
+            # use. Only the filename decryption is handed to the pool.
             try:
                 manifest = self.cdn.get_manifest(self.app_id, depot['depot_id'], depot['manifest_id'])
-                manifest.decrypt_filenames(depot['depot_key'])
-                for file_info in manifest.iter_files():
-                    if file_info.filename in master_file_map:
-                        old_depot_id = master_file_map[file_info.filename][1]
-                        self.overwrite_log.append(f"File '{file_info.filename}' from Depot {old_depot_id} was overwritten by Depot {depot['depot_id']}.")
-                    master_file_map[file_info.filename] = (file_info, depot['depot_id'])
             except Exception as e:
                 print(f"Warning: Could not process depot {depot['depot_id']}. Error: {e}")
+                continue
+            future = decrypt_futures.get(id(manifest))
+            if future is None:
+                future = decrypt_futures[id(manifest)] = self._pool.submit(self._decrypt_file_list, manifest, depot['depot_key'])
+            jobs.append((depot['depot_id'], future))
+        try:
+            # Results are folded in queue order so the "last one wins" rule still holds.
+            for depot_id, future in jobs:
+                try:
+                    depot_files = future.result()
+                except Exception as e:
+                    print(f"Warning: Could not process depot {depot_id}. Error: {e}")
+                    continue
+                for file_info in depot_files:
+                    if file_info.filename in master_file_map:
+                        old_depot_id = master_file_map[file_info.filename][1]
+                        self._log_overwrite(temp_log_path, f"File '{file_info.filename}' from Depot {old_depot_id} was overwritten by Depot {depot_id}.\n")
+                    master_file_map[file_info.filename] = (file_info, depot_id)
 
-        all_files_in_manifest = [item[0] for item in master_file_map.values()]
-        if not all_files_in_manifest:
-            print("No files to download."); return
+            all_files_in_manifest = [item[0] for item in master_file_map.values()]
+            if not all_files_in_manifest:
+                print("No files to download."); return
 
-        base_download_dir = Path(self._sanitize_filename(game_name)).resolve()
-        base_download_dir.mkdir(parents=True, exist_ok=True)
-        
-        success = self._execute_verification_and_download_cycle(all_files_in_manifest, base_download_dir, verification_only)
-        
-        if success:
-            print('\nGame Downloaded and Verified!')
-            if self.overwrite_log:
-                final_log_path = base_download_dir / 'overwritten_files.txt'
-                temp_log_path = final_log_path.with_suffix('.tmp')
-                temp_log_path.write_text("# File versions from depots listed LATER in the .sfd file were kept.\n\n" + "\n".join(self.overwrite_log))
-                final_log_path.unlink(missing_ok=True)
-                temp_log_path.rename(final_log_path)
-                print(f"Overwrite log saved to {final_log_path}")
-
-            # Automatically generate the manifest file on successful download.
-            print("\nAutomatically generating appmanifest.acf...")
-            self._run_manifest_generator(self.app_id, Path("."))
-
-
-    def _download_single_file(self, file_info: Any, base_download_dir: Path, pbar: TqdmType) -> None:
-        """The worker function for the download thread pool."""
+            base_download_dir.mkdir(parents=True, exist_ok=True)
+            
+            success = self._execute_verification_and_download_cycle(all_files_in_manifest, base_download_dir, verification_only)
+            
+            if success:
+                print('\nGame Downloaded and Verified!')
+                if self._overwrite_log_fh is not None:
+                    # The entries are already on disk; the log only needs to be made durable and moved into place.
+                    log_fh, self._overwrite_log_fh = self._overwrite_log_fh, None
+                    with log_fh:
+                        log_fh.flush()
+                        os.fsync(log_fh.fileno())
+                    os.replace(temp_log_path, final_log_path)
+                    print(f"Overwrite log saved to {final_log_path}")
+
+                # Automatically generate the manifest file on successful download.
+                print("\nAutomatically generating appmanifest.acf...")
+                self._run_manifest_generator(self.app_id, Path("."))
+        finally:
+            # A log from a download that did not complete is discarded, leaving any previous one intact.
+            if self._overwrite_log_fh is not None:
+                self._overwrite_log_fh.close()
+                self._overwrite_log_fh = None
+                temp_log_path.unlink(missing_ok=True)
+
+    def _log_overwrite(self, temp_log_path: Path, entry: str) -> None:
+        """Appends an entry to the overwrite log, opening it (header first) on the first entry."""
+        if self._overwrite_log_fh is None:
+            temp_log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._overwrite_log_fh = temp_log_path.open('wb', buffering=64 * 1024)
+            self._overwrite_log_fh.write(_OVERWRITE_LOG_HEADER)
+        self._overwrite_log_fh.write(entry.encode())
+
+    def _sync_download_dir(self, base_dir: Path) -> None:
+        """Flushes newly downloaded data to disk with a single syncfs() call. Linux only."""
+        if not sys.platform.startswith('linux'):
+            return
+        import ctypes
+
+        # syncfs() only flushes the filesystem holding the download, not every mounted one.
+        syncfs = getattr(ctypes.CDLL(None, use_errno=True), 'syncfs', None)
+        if syncfs is None:
+            return
+        print("\nFlushing downloaded files to disk...")
+        fd = os.open(base_dir, os.O_RDONLY)
+        try:
+            syncfs(fd)
+        finally:
+            os.close(fd)
+
+    def _batch_files_by_depot(self, files: List[Any]) -> List[List[Any]]:
+        """
+        Groups small files by depot into batches sized from the worker count (capped at
+        `download_batch_size`); large files each get a batch of their own.
+        """
+        def depot_of(file_info: Any) -> int:
+            return file_info.manifest.depot_id
+
+        batches = [[f] for f in files if f.size >= _BATCH_MAX_FILE_SIZE]
+        small_files = sorted((f for f in files if f.size < _BATCH_MAX_FILE_SIZE), key=depot_of)
+        target = self.max_workers * _BATCHES_PER_WORKER
+        batch_size = max(1, min(self.download_batch_size, -(-len(small_files) // target)))
+        for _, depot_files in itertools.groupby(small_files, key=depot_of):
+            depot_files = list(depot_files)
+            for i in range(0, len(depot_files), batch_size):
+                batches.append(depot_files[i:i + batch_size])
+        return batches
+
+    def _download_file_batch(self, files: List[Any], base_str: str, base_dirfd: Optional[int], progress: _DownloadProgress) -> None:
+        """Downloads a batch of files from one depot sequentially on a single pool thread."""
+        for file_info in files:
+            self._download_single_file(file_info, base_str, base_dirfd, progress)
+
+    def _make_download_dirs(self, rel_dir: str, base_str: str, base_dirfd: Optional[int]) -> None:
+        """Creates `rel_dir` inside the download directory, relative to `base_dirfd` if it is open."""
+        if base_dirfd is None:
+            os.makedirs(base_str + rel_dir, exist_ok=True); return
+        # os.makedirs has no dir_fd parameter, so each level is made in turn.
+        path = ''
+        for part in rel_dir.split(os.sep):
+            path = os.path.join(path, part)
+            try: os.mkdir(path, dir_fd=base_dirfd)
+            except FileExistsError: pass
+
+    def _get_flush_threshold(self, path: str) -> int:
+        """Rounds the flush target up to a multiple of the filesystem's preferred block size."""
+        try:
+            block_size = os.statvfs(path).f_bsize
+        except (AttributeError, OSError):  # os.statvfs is unavailable on Windows.
+            return _FLUSH_TARGET
+        return -(-_FLUSH_TARGET // block_size) * block_size
+
+    def _get_flush_buffer(self) -> memoryview:
+        """Returns this thread's reusable flush buffer, sized to the current flush threshold."""
+        buf = getattr(self._io_buffers, 'buf', None)
+        if buf is None or len(buf) != self._flush_threshold:
+            buf = self._io_buffers.buf = memoryview(bytearray(self._flush_threshold))
+        return buf
+
+    def _write_all(self, fd: int, data: Union[bytes, memoryview]) -> None:
+        """Writes all of `data` to a raw file descriptor, retrying short writes."""
+        view = memoryview(data)
+        written = 0
+        while written < len(view):
+            written += os.write(fd, view[written:])
+
+    def _iter_file_chunks(self, file_info: Any) -> Iterator[bytes]:
+        """Yields a file's data one manifest chunk at a time, from its current (resume) offset."""
+        # Iterating the file object itself yields newline-delimited lines read 256 bytes at a
+        # time; reading by chunk boundaries returns each downloaded chunk whole instead.
+        for chunk in sorted(file_info.chunks, key=lambda c: c.offset):
+            if chunk.offset >= file_info.offset:
+                yield file_info.read(chunk.cb_original)
+
+    def _writev_all(self, fd: int, views: List[memoryview]) -> None:
+        """Writes all of `views` to a raw file descriptor, retrying short writes."""
+        while views:
+            written = os.writev(fd, views)
+            while views and written >= len(views[0]):
+                written -= len(views.pop(0))
+            if written:
+                views[0] = views[0][written:]
+
+    def _write_chunks_gathered(self, file_info: Any, fd: int, progress: _DownloadProgress) -> None:
+        """Writes a file's chunks at `fd`'s position, several at a time with a single writev() call."""
+        pending: List[memoryview] = []
+        pending_bytes = 0
+        try:
+            for chunk_data in self._iter_file_chunks(file_info):
+                pending.append(memoryview(chunk_data))
+                pending_bytes += len(chunk_data)
+                if len(pending) >= _WRITEV_MAX_CHUNKS or pending_bytes >= _WRITEV_MAX_BYTES:
+                    self._writev_all(fd, pending)
+                    progress.update(pending_bytes)
+                    pending_bytes = 0
+        finally:
+            # Whatever was fetched before a failure is still written, so a resume keeps it.
+            if pending:
+                self._writev_all(fd, pending)
+                progress.update(pending_bytes)
+
+    def _write_chunks_buffered(self, file_info: Any, fd: int, progress: _DownloadProgress) -> None:
+        """Writes a file's chunks at `fd`'s position, collected into large blocks through the flush buffer."""
+        # One write and one progress update per flush rather than per chunk.
+        buf = self._get_flush_buffer()
+        filled = 0
+        try:
+            for chunk_data in self._iter_file_chunks(file_info):
+                n = len(chunk_data)
+                if filled + n > len(buf):
+                    if filled:
+                        self._write_all(fd, buf[:filled])
+                        progress.update(filled)
+                        filled = 0
+                    if n > len(buf):
+                        # Oversized chunks skip the buffer rather than growing it.
+                        self._write_all(fd, chunk_data)
+                        progress.update(n)
+                        continue
+                buf[filled:filled + n] = chunk_data
+                filled += n
+        finally:
+            # Whatever was fetched before a failure is still written, so a resume keeps it.
+            if filled:
+                self._write_all(fd, buf[:filled])
+                progress.update(filled)
+
+    def _write_chunks_mmap(self, file_info: Any, fd: int, progress: _DownloadProgress) -> None:
+        """Copies a file's chunks straight into a shared mapping of the preallocated file."""
+        # Preallocation never shrinks a file, so any stale bytes past the end are cut off here.
+        os.ftruncate(fd, file_info.size)
+        offset = file_info.offset
+        pending = 0
+        # Dirty pages reach disk through the page cache; on Linux, _sync_download_dir flushes them at the end.
+        with mmap.mmap(fd, file_info.size, access=mmap.ACCESS_WRITE) as mm:
+            try:
+                for chunk_data in self._iter_file_chunks(file_info):
+                    n = len(chunk_data)
+                    mm[offset:offset + n] = chunk_data
+                    offset += n
+                    pending += n
+                    if pending >= self._flush_threshold:
+                        progress.update(pending)
+                        pending = 0
+            finally:
+                progress.update(pending)
+
+    def _download_single_file(self, file_info: Any, base_str: str, base_dirfd: Optional[int], progress: _DownloadProgress) -> None:
+        """
+        The worker function for the download thread pool. `base_str` ends with a separator;
+        `base_dirfd` is an open descriptor of the same directory, or None where unsupported.
+        """
         try:
-            safe_path = base_download_dir / file_info.filename
-            safe_path.parent.mkdir(parents=True, exist_ok=True)
-            with safe_path.open('ab') as f_out:
-                for chunk_data in file_info:
-                    f_out.write(chunk_data)
-                    pbar.update(len(chunk_data))
+            parent = os.path.dirname(file_info.filename)
+            if parent and parent not in self._dirs_made:
+                with self._dirs_lock:
+                    if parent not in self._dirs_made:
+                        self._make_download_dirs(parent, base_str, base_dirfd)
+                        self._dirs_made.add(parent)
+            path = file_info.filename if base_dirfd is not None else base_str + file_info.filename
+            # Large files are written through a memory mapping, saving a copy per chunk.
+            want_mmap = file_info.size >= _MMAP_MIN_SIZE and hasattr(os, 'posix_fallocate')
+            fd = os.open(path, _MMAP_OPEN_FLAGS if want_mmap else _DOWNLOAD_OPEN_FLAGS, 0o644, dir_fd=base_dirfd)
+            try:
+                # Reserving the whole file up front allocates its extents once instead of per write.
+                # Unwritten space reads back as zeros, so verification still finds where to resume.
+                # Where the filesystem has no native fallocate (e.g. ntfs-3g and other FUSE drives), glibc
+                # emulates it by writing one byte per block, which is why small files are never preallocated.
+                allocated = False
+                if file_info.size >= _PREALLOCATE_MIN_SIZE and hasattr(os, 'posix_fallocate'):
+                    try: os.posix_fallocate(fd, 0, file_info.size); allocated = True
+                    except OSError: pass # Unsupported by this filesystem (or full); the file just grows as written.
+                # The mapping is only used over allocated blocks: storing into a sparse mapping on a
+                # full disk raises SIGBUS and kills the process, where a failed write is an OSError.
+                if want_mmap and allocated:
+                    self._write_chunks_mmap(file_info, fd, progress)
+                else:
+                    os.lseek(fd, file_info.offset, os.SEEK_SET)
+                    if hasattr(os, 'writev'):
+                        self._write_chunks_gathered(file_info, fd, progress)
+                    else:
+                        self._write_chunks_buffered(file_info, fd, progress)
+            finally:
+                os.close(fd)
         except Exception as e:
             # The next verification pass will catch and repair any resulting corrupt file.
-            pbar.write(f"ERROR downloading {file_info.filename}: {e}")
-
-    def run(self) -> None:
-        """The main application loop and user interface."""
-        print("!!! WARNING !!!\nTHIS SCRIPT INTERACTS WITH STEAM. USE AT YOUR OWN RISK.\n!!! ONLY LOAD .sfd's FROM TRUSTED SOURCES !!!")
-        time.sleep(3)
+            progress.write(f"ERROR downloading {file_info.filename}: {e}")
 
-        actions_without_pause = [8, 10, 11] # Login handles its own pause
+    def _render_menu(self) -> str:
+        """Returns the main menu text, only re-rendering it when the state it shows has changed."""
+        depot_ids = [d['depot_id'] for d in self.depots_to_download]
+        game_name_in_queue = self.app_name_cache.get(self.app_id, str(self.app_id)) if self.app_id else "N/A"
+        # The menu must not create the client, or startup would pay for importing steam.py.
+        logged_on = self._client is not None and self._client.logged_on
+        username = self._client.username if self._client is not None else None
+        state_key = (logged_on, username, game_name_in_queue, tuple(depot_ids))
+        if self._menu_cache is not None and self._menu_cache[0] == state_key:
+            return self._menu_cache[1]
 
-        while True:
-            self._clear_screen()
-            depot_ids = [d['depot_id'] for d in self.depots_to_download]
-            game_name_in_queue = self.app_name_cache.get(self.app_id, str(self.app_id)) if self.app_id else "N/A"
-            
-            print(f"""
+        menu = f"""
 Super Sexy Steam Downloader
       by PSS
 
-Logged in:         {self.client.logged_on} ({self.client.username or 'Not logged in'})
+Logged in:         {logged_on} ({username or 'Not logged in'})
 Game in Queue:     {game_name_in_queue}
 Depot(s) in Queue: {depot_ids or 'None'}
 
@@ -678,33 +1180,49 @@ Depot(s) in Queue: {depot_ids or 'None'}
 9. Clear Download Queue
 10. Logout
 11. Exit
-            """)
-            
-            try: selection = int(input('Selection (number): '))
-            except ValueError: print("Invalid input."); time.sleep(1); continue
+            \n"""
+        self._menu_cache = (state_key, menu)
+        return menu
+
+    def run(self) -> None:
+        """The main application loop and user interface."""
+        print("!!! WARNING !!!\nTHIS SCRIPT INTERACTS WITH STEAM. USE AT YOUR OWN RISK.\n!!! ONLY LOAD .sfd's FROM TRUSTED SOURCES !!!")
+        time.sleep(3)
+
+        actions_without_pause = frozenset({'8', '10', '11'}) # Login handles its own pause
+        # Keyed on the raw input, so no integer parsing is needed to dispatch.
+        action_map = {
+            '1': self.load_sfd_workflow,
+            '2': lambda: self.download_game(verification_only=False),
+            '3': lambda: self.download_game(verification_only=True),
+            '4': self.generate_manifest_workflow,
+            '5': self.convert_lua_workflow,
+            '6': self.make_sfd,
+            '7': self.app_id_lookup_tool,
+            '8': self.login,
+            '9': self._reset_queue,
+        }
+
+        while True:
+            self._clear_screen()
+            sys.stdout.write(self._render_menu())
             
-            action_map = {
-                1: self.load_sfd_workflow,
-                2: lambda: self.download_game(verification_only=False),
-                3: lambda: self.download_game(verification_only=True),
-                4: self.generate_manifest_workflow,
-                5: self.convert_lua_workflow,
-                6: self.make_sfd,
-                7: self.app_id_lookup_tool,
-                8: self.login,
-                9: self._reset_queue,
-            }
+            selection = input('Selection (number): ').strip()
+            action = action_map.get(selection)
 
-            if selection in action_map:
-                action_map[selection]()
-            elif selection == 10: self.client.logout(); print("Logged out."); time.sleep(1)
-            elif selection == 11: print("Exiting."); sys.exit(0)
+            if action is not None:
+                action()
+            elif selection == '10':
+                if self._client is not None: self._client.logout()
+                print("Logged out."); time.sleep(1)
+            elif selection == '11': print("Exiting."); self._pool.shutdown(); sys.exit(0)
             else: print("Invalid selection."); time.sleep(1)
 
-            if selection not in actions_without_pause and selection in action_map:
+            if action is not None and selection not in actions_without_pause:
                 input('Press Enter to continue...')
 
 
 if __name__ == "__main__":
     app = SteamDownloaderApp()
+    app.paranoid = '--paranoid' in sys.argv[1:]
     app.run()
\ No newline at end of file